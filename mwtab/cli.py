@@ -16,8 +16,8 @@ Usage:
     mwtab download (study | compound | refmet | gene | protein) <input-item> <input-value> <output-item> [--output-format=<format>] [--to-path=<path>] [--mw-rest=<url>] [--verbose]
     mwtab download moverz <input-item> <m/z-value> <ion-type-value> <m/z-tolerance-value> [--to-path=<path>] [--mw-rest=<url>] [--verbose]
     mwtab download exactmass <LIPID-abbreviation> <ion-type-value> [--to-path=<path>] [--mw-rest=<url>] [--verbose]
-    mwtab extract metadata <from-path> <to-path> <key> ... [--to-format=<format>] [--no-header]
-    mwtab extract metabolites <from-path> <to-path> (<key> <value>) ... [--to-format=<format>] [--no-header]
+    mwtab extract metadata <from-path> <to-path> <key> ... [--to-format=<format>] [--no-header] [--pretty]
+    mwtab extract metabolites <from-path> <to-path> (<key> <value>) ... [--to-format=<format>] [--no-header] [--pretty] [--processes=<n>]
 
 Options:
     -h, --help                      Show this screen.
@@ -38,6 +38,8 @@ Options:
     --output-item=<item>            Item to be retrieved from Metabolomics Workbench.
     --output-format=<format>        Format for item to be retrieved in, available formats: mwtab, json.
     --no-header                     Include header at the top of csv formatted files.
+    --pretty                        Indent json formatted files, otherwise they are written compactly.
+    --processes=<n>                 Number of worker processes to read and extract metabolites from files with.
 
     For extraction <to-path> can take a "-" which will use stdout.
 """
@@ -291,20 +293,23 @@ def cli(cmdargs):
     elif cmdargs["extract"]:
         mwfile_generator = fileio.read_files(cmdargs["<from-path>"])
         if cmdargs["metabolites"]:
-            metabolites_dict = mwextract.extract_metabolites(
-                mwfile_generator,
-                mwextract.generate_matchers(
-                    [(cmdargs["<key>"][i],
-                      cmdargs["<value>"][i] if not cmdargs["<value>"][i][:2] == "r'" else re.compile(cmdargs["<value>"][i][2:-1]))
-                     for i in range(len(cmdargs["<key>"]))]
-                )
+            matchers = mwextract.generate_matchers(
+                [(cmdargs["<key>"][i],
+                  cmdargs["<value>"][i] if not cmdargs["<value>"][i][:2] == "r'" else re.compile(cmdargs["<value>"][i][2:-1]))
+                 for i in range(len(cmdargs["<key>"]))]
             )
+            if cmdargs["--processes"]:
+                metabolites_dict = mwextract.extract_metabolites_from_paths(
+                    [cmdargs["<from-path>"]], matchers, int(cmdargs["--processes"])
+                )
+            else:
+                metabolites_dict = mwextract.extract_metabolites(mwfile_generator, matchers)
 
             if cmdargs["<to-path>"] != "-":
                 if cmdargs["--to-format"] == "csv":
                     mwextract.write_metabolites_csv(cmdargs["<to-path>"], metabolites_dict, cmdargs["--no-header"])
                 else:
-                    mwextract.write_json(cmdargs["<to-path>"], metabolites_dict)
+                    mwextract.write_json(cmdargs["<to-path>"], metabolites_dict, cmdargs["--pretty"])
             else:
                 print(json.dumps(metabolites_dict, indent=4, cls=mwextract.SetEncoder))
 
@@ -317,6 +322,6 @@ def cli(cmdargs):
                 if cmdargs["--to-format"] == "csv":
                     mwextract.write_metadata_csv(cmdargs["<to-path>"], metadata, cmdargs["--no-header"])
                 else:
-                    mwextract.write_json(cmdargs["<to-path>"], metadata)
+                    mwextract.write_json(cmdargs["<to-path>"], metadata, cmdargs["--pretty"])
             else:
                 print(metadata)
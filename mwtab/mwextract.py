@@ -9,16 +9,32 @@ This module provides a number of functions and classes for extracting and saving
 stored in ``mwTab`` formatted files in the form of :class:`~mwtab.mwtab.MWTabFile`.
 """
 import csv
+import functools
 import json
+from collections import defaultdict
+import multiprocessing
 import os
 import re
 
+from . import fileio
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+CSV_BUFFER_SIZE = 1 << 20
+
 
 class ItemMatcher(object):
     """ItemMatcher class that can be called to match items from ``mwTab`` formatted files in the form of
     :class:`~mwtab.mwtab.MWTabFile`.
     """
 
+    #: Relative cost of calling the matcher, used to evaluate cheaper matchers first.
+    cost = 1
+
     section_conversion = {
         "PR": "PROJECT",
         "ST": "STUDY",
@@ -60,6 +76,8 @@ class ReGeXMatcher(ItemMatcher):
     :class:`~mwtab.mwtab.MWTabFile` using regular expressions.
     """
 
+    cost = 10
+
     def __init__(self, full_key, value_comparison):
         """ItemMatcher initializer.
 
@@ -69,6 +87,7 @@ class ReGeXMatcher(ItemMatcher):
         :type value_comparison: :class:`re.Pattern`
         """
         super(ReGeXMatcher, self).__init__(full_key, value_comparison)
+        self._pattern = re.compile(value_comparison)
 
     def __call__(self, mwtabfile):
         """Match key value pair in :class:`~mwtab.mwtab.MWTabFile`.
@@ -78,7 +97,7 @@ class ReGeXMatcher(ItemMatcher):
         :return: True if key and value are present, False otherwise.
         :rtype: :py:obj:`True` or :py:obj:`False`
         """
-        return re.search(self.value_comparison, mwtabfile[self.section][self.key])
+        return self._pattern.search(mwtabfile[self.section][self.key])
 
 
 def generate_matchers(items):
@@ -97,32 +116,108 @@ def generate_matchers(items):
             yield ItemMatcher(item[0], item[1])
 
 
-def extract_metabolites(sources, matchers):
-    """Extract metabolite data from ``mwTab`` formatted files in the form of :class:`~mwtab.mwtab.MWTabFile`.
+def _positive_samples(data_list):
+    """Find samples with a positive measured value in a single row of metabolite data.
+
+    :param dict data_list: Metabolite data row mapping sample ids to measured values.
+    :return: List of sample ids with values greater than zero.
+    :rtype: :py:class:`list`
+    """
+    positive_samples = []
+    for sample_key, value in data_list.items():
+        if sample_key not in ("Metabolite", "Bin range(ppm)"):
+            try:
+                if float(value) > 0:
+                    positive_samples.append(sample_key)
+            except (TypeError, ValueError):
+                pass
+    return positive_samples
+
+
+def _extract_flat_metabolites(sources, matchers):
+    """Extract metabolite data from ``mwTab`` formatted files into a flat dictionary.
 
     :param generator sources: Generator of mwtab file objects (:class:`~mwtab.mwtab.MWTabFile`).
-    :param generator matchers: Generator of matcher objects (:class:`~mwtab.mwextract.ItemMatcher` or
-    :class:`~mwtab.mwextract.ReGeXMatcher`).
-    :return: Extracted metabolites dictionary.
+    :param list matchers: List of matcher objects.
+    :return: Dictionary of positive sample ids keyed by (metabolite, study id, analysis id).
     :rtype: :py:class:`dict`
     """
-    metabolites = dict()
+    flat_metabolites = defaultdict(set)
     for mwtabfile in sources:
         if all(matcher(mwtabfile) for matcher in matchers):
             data_section_key = list(set(mwtabfile.keys()) & {"MS_METABOLITE_DATA", "NMR_METABOLITE_DATA", "NMR_BINNED_DATA"})[0]
+            study_id = mwtabfile.study_id
+            analysis_id = mwtabfile.analysis_id
             for data_list in mwtabfile[data_section_key]["Data"]:
-                for test_key in (key for key in data_list.keys() if key != "Metabolite"):
-                    try:
-                        if float(data_list[test_key]) > 0:
-                            metabolites.setdefault(data_list["Metabolite"], dict())\
-                                .setdefault(mwtabfile.study_id, dict())\
-                                .setdefault(mwtabfile.analysis_id, set())\
-                                .add(test_key)
-                    except Exception as e:
-                        pass
+                # binned data rows are named by "Bin range(ppm)" instead of "Metabolite" and are not extracted
+                if "Metabolite" not in data_list:
+                    continue
+                positive_samples = _positive_samples(data_list)
+                if positive_samples:
+                    flat_metabolites[(data_list["Metabolite"], study_id, analysis_id)].update(positive_samples)
+    return flat_metabolites
+
+
+def _nest_metabolites(flat_metabolites):
+    """Convert flat dictionary of extracted metabolite data into nested metabolite, study id, analysis id dictionary.
+
+    :param dict flat_metabolites: Dictionary of positive sample ids keyed by (metabolite, study id, analysis id).
+    :return: Extracted metabolites dictionary.
+    :rtype: :py:class:`dict`
+    """
+    metabolites = dict()
+    for (metabolite, study_id, analysis_id), samples in flat_metabolites.items():
+        metabolites.setdefault(metabolite, dict()).setdefault(study_id, dict())[analysis_id] = samples
     return metabolites
 
 
+def extract_metabolites(sources, matchers):
+    """Extract metabolite data from ``mwTab`` formatted files in the form of :class:`~mwtab.mwtab.MWTabFile`.
+
+    :param generator sources: Generator of mwtab file objects (:class:`~mwtab.mwtab.MWTabFile`).
+    :param generator matchers: Generator of matcher objects (:class:`~mwtab.mwextract.ItemMatcher` or
+    :class:`~mwtab.mwextract.ReGeXMatcher`).
+    :return: Extracted metabolites dictionary.
+    :rtype: :py:class:`dict`
+    """
+    matchers = sorted(matchers, key=lambda matcher: getattr(matcher, "cost", ItemMatcher.cost))
+    return _nest_metabolites(_extract_flat_metabolites(sources, matchers))
+
+
+def _extract_path_metabolites(path, matchers):
+    """Read ``mwTab`` formatted files from a single path and extract their metabolite data into a flat dictionary.
+
+    :param str path: Path to file, archive or URL.
+    :param list matchers: List of matcher objects.
+    :return: Dictionary of positive sample ids keyed by (metabolite, study id, analysis id).
+    :rtype: :py:class:`dict`
+    """
+    return _extract_flat_metabolites(fileio.read_files(path), matchers)
+
+
+def extract_metabolites_from_paths(paths, matchers, processes=None):
+    """Extract metabolite data from ``mwTab`` formatted files using a pool of worker processes.
+
+    Paths are expanded the same way as in :func:`~mwtab.fileio.read_files`. Each resulting file, archive or URL
+    is read, matched and extracted in a worker process and the partial results are merged.
+
+    :param list paths: Paths to files, directories, archives or URLs.
+    :param generator matchers: Generator of matcher objects (:class:`~mwtab.mwextract.ItemMatcher` or
+    :class:`~mwtab.mwextract.ReGeXMatcher`).
+    :param int processes: Number of worker processes, defaults to the number of CPUs.
+    :return: Extracted metabolites dictionary.
+    :rtype: :py:class:`dict`
+    """
+    matchers = sorted(matchers, key=lambda matcher: getattr(matcher, "cost", ItemMatcher.cost))
+    flat_metabolites = defaultdict(set)
+    with multiprocessing.Pool(processes) as pool:
+        extract_path = functools.partial(_extract_path_metabolites, matchers=matchers)
+        for path_metabolites in pool.imap(extract_path, fileio._generate_filenames(paths), chunksize=4):
+            for key, samples in path_metabolites.items():
+                flat_metabolites[key].update(samples)
+    return _nest_metabolites(flat_metabolites)
+
+
 def extract_metadata(mwtabfile, keys):
     """Extract metadata data from ``mwTab`` formatted files in the form of :class:`~mwtab.mwtab.MWTabFile`.
 
@@ -132,14 +227,33 @@ def extract_metadata(mwtabfile, keys):
     :return: Extracted metadata dictionary.
     :rtype: :py:class:`dict`
     """
-    extracted_values = {}
-    for section in mwtabfile:
-        for metadata in mwtabfile[section]:
-            for key in keys:
-                if metadata == key:  # TODO: Allow for partial match, ReGeX, etc.
-                    extracted_values.setdefault(key, set()).add(mwtabfile[section][metadata])
+    keys = frozenset(keys)
+    extracted_values = defaultdict(set)
+    for section in mwtabfile.values():
+        # SUBJECT_SAMPLE_FACTORS is a list of samples, not a section of metadata items
+        if not isinstance(section, dict):
+            continue
+        for metadata in section:
+            if metadata in keys:  # TODO: Allow for partial match, ReGeX, etc.
+                extracted_values[metadata].add(section[metadata])
+
+    return dict(extracted_values)
+
 
-    return extracted_values
+def freeze_extracted(extracted_values):
+    """Convert sets of values in extracted data or metadata :py:class:`dict` into sorted tuples, so that several
+    consumers of the same extracted values do not each need to sort them.
+
+    :param dict extracted_values: Metabolites data or metadata dictionary.
+    :return: Dictionary with the same structure where sets are replaced by sorted tuples.
+    :rtype: :py:class:`dict`
+    """
+    return {
+        key: freeze_extracted(value) if isinstance(value, dict)
+        else tuple(sorted(value)) if isinstance(value, (set, frozenset))
+        else value
+        for key, value in extracted_values.items()
+    }
 
 
 def write_metadata_csv(to_path, extracted_values, no_header=False):
@@ -155,25 +269,23 @@ def write_metadata_csv(to_path, extracted_values, no_header=False):
     :return: None
     :rtype: :py:obj:`None`
     """
-    if not os.path.exists(os.path.dirname(os.path.splitext(to_path)[0])):
-        dirname = os.path.dirname(to_path)
-        if dirname:
-            os.makedirs(dirname)
+    dirname = os.path.dirname(to_path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
 
     if not os.path.splitext(to_path)[1]:
         to_path += ".csv"
 
-    with open(to_path, "w", newline="") as outfile:
+    csv_list = [[key, *sorted(extracted_values[key])] for key in extracted_values]
+
+    with open(to_path, "w", newline="", buffering=CSV_BUFFER_SIZE) as outfile:
         wr = csv.writer(outfile, quoting=csv.QUOTE_ALL)
         if not no_header:
             max_value_num = max([len(extracted_values[key]) for key in extracted_values.keys()])
             line_list = ["metadata"]
             line_list.extend(["value{}".format(num) for num in range(max_value_num)])
             wr.writerow(line_list)
-        for key in extracted_values:
-            line_list = [key]
-            line_list.extend([val for val in sorted(extracted_values[key])])
-            wr.writerow(line_list)
+        wr.writerows(csv_list)
 
 
 def write_metabolites_csv(to_path, extracted_values, no_header=False):
@@ -207,20 +319,18 @@ def write_metabolites_csv(to_path, extracted_values, no_header=False):
             num_samples
         ])
 
-    if not os.path.exists(os.path.dirname(os.path.splitext(to_path)[0])):
-        dirname = os.path.dirname(to_path)
-        if dirname:
-            os.makedirs(dirname)
+    dirname = os.path.dirname(to_path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
 
     if not os.path.splitext(to_path)[1]:
         to_path += ".csv"
 
-    with open(to_path, "w", newline="") as outfile:
+    with open(to_path, "w", newline="", buffering=CSV_BUFFER_SIZE) as outfile:
         wr = csv.writer(outfile, quoting=csv.QUOTE_ALL)
         if not no_header:
             wr.writerow(["metabolite_name", "num-studies", "num_analyses", "num_samples"])
-        for line_list in csv_list:
-            wr.writerow(line_list)
+        wr.writerows(csv_list)
 
 
 class SetEncoder(json.JSONEncoder):
@@ -243,41 +353,64 @@ class SetEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
-def write_json(to_path, extracted_dict):
-    """Write extracted data or metadata :py:class:`dict` into json file.
+def _orjson_default(obj):
+    """Encode Python objects not natively supported by :mod:`orjson`. If object passed is a set, converts the set
+    to JSON serializable list.
+
+    :param object obj: Python object to be json encoded.
+    :return: JSON serializable object.
+    :rtype: :py:class:`list`
+    """
+    if isinstance(obj, set):
+        return list(obj)
+    raise TypeError("Object of type {} is not JSON serializable".format(type(obj).__name__))
+
+
+def write_json(to_path, extracted_dict, pretty=False):
+    """Write extracted data or metadata :py:class:`dict` into json file. Uses :mod:`orjson` for serialization
+    when it is installed and falls back to the standard library :mod:`json` otherwise. Output is compact unless
+    ``pretty`` is set, in which case it is indented as in the examples below.
 
     Metabolites example:
     {
-        "1,2,4-benzenetriol": {
-            "ST000001": {
-                "AN000001": [
-                    "LabF_115816",
-                    ...
-                ]
-            }
+      "1,2,4-benzenetriol": {
+        "ST000001": {
+          "AN000001": [
+            "LabF_115816",
+            ...
+          ]
         }
+      }
     }
 
     Metadata example:
     {
-        "SUBJECT_TYPE": [
-            "Plant",
-            "Human"
-        ]
+      "SUBJECT_TYPE": [
+        "Plant",
+        "Human"
+      ]
     }
 
     :param str to_path: Path to output file.
     :param dict extracted_dict: Metabolites data or metadata dictionary to be saved.
+    :param bool pretty: If true output is indented, otherwise output is compact.
     :return: None
     :rtype: :py:obj:`None`
     """
-    if not os.path.exists(os.path.dirname(os.path.splitext(to_path)[0])):
-        dirname = os.path.dirname(to_path)
-        if dirname:
-            os.makedirs(dirname)
+    dirname = os.path.dirname(to_path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
 
     if not os.path.splitext(to_path)[1]:
         to_path += ".json"
 
-    with open(to_path, "w") as outfile:
-        json.dump(extracted_dict, outfile, sort_keys=True, indent=4, cls=SetEncoder)
+    if orjson is not None:
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_INDENT_2 if pretty else orjson.OPT_SORT_KEYS
+        with open(to_path, "wb") as outfile:
+            outfile.write(orjson.dumps(extracted_dict, default=_orjson_default, option=option))
+    else:
+        with open(to_path, "w") as outfile:
+            if pretty:
+                json.dump(extracted_dict, outfile, sort_keys=True, indent=2, cls=SetEncoder)
+            else:
+                json.dump(extracted_dict, outfile, sort_keys=True, separators=(",", ":"), cls=SetEncoder)
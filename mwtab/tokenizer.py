@@ -16,12 +16,59 @@ Each token is a tuple of "key-value"-like pairs, tuple of
 """
 
 from __future__ import print_function, division, unicode_literals
-from collections import deque, namedtuple, OrderedDict
+from collections import namedtuple, OrderedDict
+from sys import intern
 
 
 KeyValue = namedtuple("KeyValue", ["key", "value"])
 KeyValueExtra = namedtuple("KeyValueExtra", ["key", "value", "extra"])
 
+# Results file items (see ``mwschema``) may carry extra tab separated fields.
+_RESULTS_FILE_KEYS = ("MS:MS_RESULTS_FILE", "NM:NMR_RESULTS_FILE")
+
+# Tokens are immutable, so tokens that never change are created once and shared.
+_HEADER = KeyValue("#METABOLOMICS WORKBENCH", "\n")
+_SUBJECT_SAMPLE_FACTORS_HEADER = KeyValue("#SUBJECT_SAMPLE_FACTORS", "\n")
+_END_SECTION = KeyValue("#ENDSECTION", "\n")
+_END_FILE = KeyValue("!#ENDFILE", "\n")
+
+
+def _split_pairs(text, item_separator, pair_separator):
+    """Split text of separated "name<pair_separator>value" items into dictionary.
+
+    :param str text: Text to be split.
+    :param str item_separator: Separator between items.
+    :param str pair_separator: Separator between name and value within item.
+    :return: Dictionary of stripped names and values.
+    :rtype: py:class:`dict`
+    """
+    pairs = {}
+    for item in text.split(item_separator):
+        key, separator, value = item.partition(pair_separator)
+        if not separator:
+            raise IndexError("missing {!r} separator in {!r}".format(pair_separator, item))
+        pairs[key.strip()] = value.strip()
+    return pairs
+
+
+def _iter_lines(text):
+    """Generate lines of text one at a time without splitting the whole text up front.
+
+    :param text: Text to be split into lines.
+    :type text: py:class:`str`
+    :return: Lines of text, without the "\\n" line separator.
+    :rtype: py:class:`str`
+    """
+    position = 0
+    find = text.find
+    while True:
+        newline = find("\n", position)
+        if newline < 0:
+            yield text[position:]
+            return
+        yield text[position:newline]
+        position = newline + 1
+
 
 def tokenizer(text):
     """A lexical analyzer for the `mwtab` formatted files.
@@ -31,29 +78,37 @@ def tokenizer(text):
     :return: Tuples of data.
     :rtype: py:class:`~collections.namedtuple`
     """
-    stream = deque(text.split("\n"))
+    lines = _iter_lines(text)
 
-    while len(stream) > 0:
-        line = stream.popleft()
+    for line in lines:
         try:
 
-            # header
-            if line.startswith("#METABOLOMICS WORKBENCH"):
-                yield KeyValue("#METABOLOMICS WORKBENCH", "\n")
-                for identifier in line.split(" "):
-                    if ":" in identifier:
-                        key, value = identifier.split(":")
-                        yield KeyValue(key, value)
-
-            # SUBJECT_SAMPLE_FACTORS header (reached new section)
-            elif line.startswith("#SUBJECT_SAMPLE_FACTORS:"):
-                yield KeyValue("#ENDSECTION", "\n")
-                yield KeyValue("#SUBJECT_SAMPLE_FACTORS", "\n")
-
-            # section header (reached new section)
-            elif line.startswith("#"):
-                yield KeyValue("#ENDSECTION", "\n")
-                yield KeyValue(line.strip(), "\n")
+            # blank line
+            if not line:
+                continue
+
+            # header lines, dispatched on the first character so item and data lines skip these checks
+            elif line[0] == "#":
+
+                # header
+                if line.startswith("#METABOLOMICS WORKBENCH"):
+                    yield _HEADER
+                    for identifier in line.split(" "):
+                        key, separator, value = identifier.partition(":")
+                        if separator:
+                            if ":" in value:
+                                raise ValueError("too many \":\" separators in {!r}".format(identifier))
+                            yield KeyValue(key, value)
+
+                # SUBJECT_SAMPLE_FACTORS header (reached new section)
+                elif line.startswith("#SUBJECT_SAMPLE_FACTORS:"):
+                    yield _END_SECTION
+                    yield _SUBJECT_SAMPLE_FACTORS_HEADER
+
+                # section header (reached new section)
+                else:
+                    yield _END_SECTION
+                    yield KeyValue(line.strip(), "\n")
 
             # SUBJECT_SAMPLE_FACTORS line
             elif line.startswith("SUBJECT_SAMPLE_FACTORS"):
@@ -61,13 +116,10 @@ def tokenizer(text):
                 subject_sample_factors_dict = OrderedDict({
                     "Subject ID": line_items[1],
                     "Sample ID": line_items[2],
-                    "Factors": {factor_item.split(":")[0].strip(): factor_item.split(":")[1].strip() for factor_item in
-                                line_items[3].split("|")}
+                    "Factors": _split_pairs(line_items[3], "|", ":")
                 })
                 if line_items[4]:
-                    subject_sample_factors_dict["Additional sample data"] = {
-                        factor_item.split("=")[0].strip(): factor_item.split("=")[1].strip() for factor_item in line_items[4].split(";")
-                    }
+                    subject_sample_factors_dict["Additional sample data"] = _split_pairs(line_items[4], ";", "=")
                 yield KeyValue(line_items[0].strip(), subject_sample_factors_dict)
 
             # data start header
@@ -75,17 +127,18 @@ def tokenizer(text):
                 yield KeyValue(line, "\n")
 
                 # tokenize lines in data section till line ending with "_END" is reached
-                while not line.endswith("_END"):
-                    line = stream.popleft()
+                for line in lines:
                     if line.endswith("_END"):
                         yield KeyValue(line.strip(), "\n")
-                    else:
-                        data = line.split("\t")
-                        yield KeyValue(data[0], tuple(data))
+                        break
+                    data = line.split("\t")
+                    yield KeyValue(data[0], tuple(data))
+                else:
+                    raise IndexError("end of file reached before line ending with \"_END\"")
 
             # item line in item section (e.g. PROJECT, SUBJECT, etc..)
-            elif line:
-                if "_RESULTS_FILE" in line:
+            else:
+                if line.lstrip().startswith(_RESULTS_FILE_KEYS):
                     line_items = line.split("\t")
                     # if len(line_items) > 2:
                     #     extra_items = list()
@@ -95,16 +148,18 @@ def tokenizer(text):
                     #     yield KeyValueExtra(line_items[0].strip()[3:], line_items[1], extra_items)
                     # else:
                     #     yield KeyValue(line_items[0].strip()[3:], line_items[1])
-                    yield KeyValue(line_items[0].strip()[3:], " ".join(line_items[1:]))
+                    yield KeyValue(intern(line_items[0].strip()[3:]), " ".join(line_items[1:]))
                 else:
-                    key, value = line.split("\t")
+                    key, separator, value = line.partition("\t")
+                    if not separator or "\t" in value:
+                        raise ValueError("expected exactly one tab separating key and value")
                     if ":" in key:
                         if ":UNITS" in key:
                             yield KeyValue("Units", value)
                         else:
-                            yield KeyValue(key.strip()[3:], value)
+                            yield KeyValue(intern(key.strip()[3:]), value)
                     else:
-                        yield KeyValue(key.strip(), value)
+                        yield KeyValue(intern(key.strip()), value)
 
         except IndexError as e:
             raise IndexError("LINE WITH ERROR:\n\t", repr(line), e)
@@ -112,5 +167,5 @@ def tokenizer(text):
             raise ValueError("LINE WITH ERROR:\n\t", repr(line), e)
 
     # end of file
-    yield KeyValue("#ENDSECTION", "\n")
-    yield KeyValue("!#ENDFILE", "\n")  # This is to ensure that tokenizer terminates when #END is missing.
+    yield _END_SECTION
+    yield _END_FILE  # This is to ensure that tokenizer terminates when #END is missing.
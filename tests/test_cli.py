@@ -133,7 +133,8 @@ def test_download_command(command):
 @pytest.mark.parametrize("from_path, to_path, key, to_format, no_header", [
     ("tests/example_data/mwtab_files/", "tests/example_data/tmp/test_extract_metadata", "SUBJECT_TYPE", "csv", " --no-header"),
     ("tests/example_data/mwtab_files/", "tests/example_data/tmp/test_extract_metadata", "SUBJECT_TYPE", "csv", ""),
-    ("tests/example_data/mwtab_files/", "tests/example_data/tmp/test_extract_metadata", "SUBJECT_TYPE", "json", "")
+    ("tests/example_data/mwtab_files/", "tests/example_data/tmp/test_extract_metadata", "SUBJECT_TYPE", "json", ""),
+    ("tests/example_data/mwtab_files/", "tests/example_data/tmp/test_extract_metadata", "SUBJECT_TYPE", "json", " --pretty")
 ])
 def test_extract_metadata_command(from_path, to_path, key, to_format, no_header):
     command = "python -m mwtab extract metadata {} {} {} --to-format={}{}".format(
@@ -1,3 +1,136 @@
+import csv
+import json
+import os
+import re
+import shutil
+from collections import OrderedDict
 import pytest
 import mwtab
+from mwtab import mwextract
 
+
+def teardown_module(module):
+    if os.path.exists("tests/example_data/tmp"):
+        shutil.rmtree("tests/example_data/tmp")
+
+
+def test_extract_metabolites():
+    metabolites = mwextract.extract_metabolites(
+        mwtab.read_files("tests/example_data/mwtab_files/ST000122_AN000204.txt"),
+        mwextract.generate_matchers([("SU:SUBJECT_TYPE", "Human")])
+    )
+    assert type(metabolites) == dict
+    assert type(metabolites["17-hydroxypregnenolone"]) == dict
+    assert type(metabolites["17-hydroxypregnenolone"]["ST000122"]) == dict
+    assert len(metabolites["17-hydroxypregnenolone"]["ST000122"]["AN000204"]) == 13
+    assert "CER040_242995_ML_2" not in metabolites["17-hydroxypregnenolone"]["ST000122"]["AN000204"]
+
+
+@pytest.mark.parametrize("data_list, positive_samples", [
+    (OrderedDict([("Metabolite", "m1"), ("S1", "1.5"), ("S2", "0.0000"), ("S3", "2")]), ["S1", "S3"]),
+    (OrderedDict([("Metabolite", "m1"), ("S1", "1.5"), ("S2", ""), ("S3", "NA")]), ["S1"]),
+    (OrderedDict([("Metabolite", "m1")]), [])
+])
+def test_positive_samples(data_list, positive_samples):
+    assert mwextract._positive_samples(data_list) == positive_samples
+
+
+@pytest.mark.parametrize("value_comparison, match", [
+    ("Hum", True),
+    (re.compile("^Hum"), True),
+    (re.compile("Plant"), False)
+])
+def test_regex_matcher(value_comparison, match):
+    mwtabfile = next(mwtab.read_files("tests/example_data/mwtab_files/ST000122_AN000204.txt"))
+    matcher = mwextract.ReGeXMatcher("SU:SUBJECT_TYPE", value_comparison)
+    assert bool(matcher(mwtabfile)) == match
+
+
+def test_extract_metabolites_matchers_applied_to_every_file():
+    metabolites = mwextract.extract_metabolites(
+        mwtab.read_files("tests/example_data/mwtab_files/"),
+        mwextract.generate_matchers([("SU:SUBJECT_TYPE", re.compile("Hum")), ("SU:SUBJECT_TYPE", "Plant")])
+    )
+    assert metabolites == {}
+
+
+@pytest.mark.parametrize("to_path, no_header", [
+    ("tests/example_data/tmp/test_write_metabolites", False),
+    ("tests/example_data/tmp/test_write_metabolites", True),
+    ("tests/example_data/tmp/test_write_metabolites.csv", False)
+])
+def test_write_metabolites_csv(to_path, no_header):
+    metabolites = mwextract.extract_metabolites(
+        mwtab.read_files("tests/example_data/mwtab_files/ST000122_AN000204.txt"),
+        mwextract.generate_matchers([("SU:SUBJECT_TYPE", "Human")])
+    )
+    mwextract.write_metabolites_csv(to_path, metabolites, no_header)
+
+    with open(os.path.splitext(to_path)[0] + ".csv", "r") as fh:
+        data = list(csv.reader(fh))
+    if not no_header:
+        assert data.pop(0) == ["metabolite_name", "num-studies", "num_analyses", "num_samples"]
+    assert len(data) == len(metabolites)
+    assert ["17-hydroxypregnenolone", "1", "1", "13"] in data
+
+
+@pytest.mark.parametrize("keys, extracted_values", [
+    (["SUBJECT_TYPE"], {"SUBJECT_TYPE": {"Human"}}),
+    (["SUBJECT_TYPE", "STUDY_ID", "NOT_A_KEY"], {"SUBJECT_TYPE": {"Human"}, "STUDY_ID": {"ST000122"}}),
+    ([], {})
+])
+def test_extract_metadata(keys, extracted_values):
+    mwtabfile = next(mwtab.read_files("tests/example_data/mwtab_files/ST000122_AN000204.txt"))
+    assert mwextract.extract_metadata(mwtabfile, keys) == extracted_values
+
+
+@pytest.mark.parametrize("use_orjson, pretty", [
+    (True, False),
+    (True, True),
+    (False, False),
+    (False, True)
+])
+def test_write_json(use_orjson, pretty, monkeypatch):
+    if use_orjson:
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(mwextract, "orjson", None)
+    metabolites = mwextract.extract_metabolites(
+        mwtab.read_files("tests/example_data/mwtab_files/ST000122_AN000204.txt"),
+        mwextract.generate_matchers([("SU:SUBJECT_TYPE", "Human")])
+    )
+    mwextract.write_json("tests/example_data/tmp/test_write_json", metabolites, pretty)
+
+    with open("tests/example_data/tmp/test_write_json.json", "r") as fh:
+        text = fh.read()
+    assert ("\n" in text) == pretty
+    if pretty:
+        assert text.startswith('{\n  "')
+    data = json.loads(text)
+    assert set(data) == set(metabolites)
+    assert set(data["17-hydroxypregnenolone"]["ST000122"]["AN000204"]) == \
+        metabolites["17-hydroxypregnenolone"]["ST000122"]["AN000204"]
+
+
+def test_freeze_extracted():
+    extracted_values = {"m1": {"ST1": {"AN1": {"S2", "S1"}}}, "SUBJECT_TYPE": {"Plant", "Human"}}
+    assert mwextract.freeze_extracted(extracted_values) == \
+        {"m1": {"ST1": {"AN1": ("S1", "S2")}}, "SUBJECT_TYPE": ("Human", "Plant")}
+
+
+def test_extract_metabolites_binned_data():
+    mwtabfile = mwtab.mwtab.MWTabFile("test")
+    mwtabfile.study_id, mwtabfile.analysis_id = "ST000001", "AN000001"
+    mwtabfile["NMR_BINNED_DATA"] = {
+        "Data": [OrderedDict([("Bin range(ppm)", "0.50...0.54"), ("S1", "1.5"), ("S2", "0")])]
+    }
+    assert mwextract.extract_metabolites([mwtabfile], []) == {}
+
+
+def test_extract_metabolites_from_paths():
+    matchers = [("SU:SUBJECT_TYPE", "Human")]
+    assert mwextract.extract_metabolites_from_paths(
+        ["tests/example_data/mwtab_files/"], mwextract.generate_matchers(matchers), processes=2
+    ) == mwextract.extract_metabolites(
+        mwtab.read_files("tests/example_data/mwtab_files/"), mwextract.generate_matchers(matchers)
+    )
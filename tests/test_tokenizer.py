@@ -0,0 +1,99 @@
+import pytest
+from mwtab.tokenizer import tokenizer, KeyValue, _iter_lines
+
+
+def test_data_block():
+    tokens = list(tokenizer("MS_METABOLITE_DATA_START\nSamples\tS1\tS2\nm1\t1.0\t0.0\nMS_METABOLITE_DATA_END"))
+    assert tokens[:4] == [
+        KeyValue("MS_METABOLITE_DATA_START", "\n"),
+        KeyValue("Samples", ("Samples", "S1", "S2")),
+        KeyValue("m1", ("m1", "1.0", "0.0")),
+        KeyValue("MS_METABOLITE_DATA_END", "\n")
+    ]
+
+
+def test_unterminated_data_block():
+    with pytest.raises(IndexError):
+        list(tokenizer("MS_METABOLITE_DATA_START\nSamples\tS1\tS2\nm1\t1.0\t0.0"))
+
+
+def test_headers_and_blank_lines():
+    tokens = list(tokenizer(
+        "#METABOLOMICS WORKBENCH STUDY_ID:ST000001 ANALYSIS_ID:AN000001\n\n#PROJECT\nPR:PROJECT_TITLE\tTitle\n\n"
+        "#SUBJECT_SAMPLE_FACTORS:         \tSUBJECT(optional)[tab]SAMPLE[tab]FACTORS\n"
+    ))
+    assert tokens == [
+        KeyValue("#METABOLOMICS WORKBENCH", "\n"),
+        KeyValue("STUDY_ID", "ST000001"),
+        KeyValue("ANALYSIS_ID", "AN000001"),
+        KeyValue("#ENDSECTION", "\n"),
+        KeyValue("#PROJECT", "\n"),
+        KeyValue("PROJECT_TITLE", "Title"),
+        KeyValue("#ENDSECTION", "\n"),
+        KeyValue("#SUBJECT_SAMPLE_FACTORS", "\n"),
+        KeyValue("#ENDSECTION", "\n"),
+        KeyValue("!#ENDFILE", "\n")
+    ]
+
+
+@pytest.mark.parametrize("line, factors, additional_sample_data", [
+    ("SUBJECT_SAMPLE_FACTORS\t-\tS1\tTime:10:30 | Treatment:None\t", {"Time": "10:30", "Treatment": "None"}, None),
+    ("SUBJECT_SAMPLE_FACTORS\t-\tS1\tTreatment:None\tRAW_FILE_NAME=a=b.raw; Age=5",
+     {"Treatment": "None"}, {"RAW_FILE_NAME": "a=b.raw", "Age": "5"})
+])
+def test_subject_sample_factors(line, factors, additional_sample_data):
+    token = next(tokenizer(line))
+    assert token.key == "SUBJECT_SAMPLE_FACTORS"
+    assert token.value["Sample ID"] == "S1"
+    assert token.value["Factors"] == factors
+    assert token.value.get("Additional sample data") == additional_sample_data
+
+
+@pytest.mark.parametrize("line", [
+    "SUBJECT_SAMPLE_FACTORS\t-\tS1\tTreatment\t",
+    "SUBJECT_SAMPLE_FACTORS\t-\tS1\tTreatment:None\tAge"
+])
+def test_subject_sample_factors_missing_separator(line):
+    with pytest.raises(IndexError):
+        list(tokenizer(line))
+
+
+@pytest.mark.parametrize("line", [
+    "PR:PROJECT_TITLE",
+    "PR:PROJECT_TITLE\tTitle\tExtra",
+    "#METABOLOMICS WORKBENCH STUDY_ID:ST000001:extra"
+])
+def test_malformed_item_line(line):
+    with pytest.raises(ValueError):
+        list(tokenizer(line))
+
+
+def test_units_item_line():
+    assert list(tokenizer("MS_METABOLITE_DATA:UNITS\tPeak area"))[0] == KeyValue("Units", "Peak area")
+
+
+def test_token_types():
+    tokens = list(tokenizer("#PROJECT\nPR:PROJECT_TITLE\tTitle\nMS_METABOLITE_DATA_START\nm1\t1.0\nMS_METABOLITE_DATA_END"))
+    assert all(type(token) == KeyValue for token in tokens)
+
+
+@pytest.mark.parametrize("text", ["", "a", "a\n", "\n", "a\nb", "a\n\nb\n"])
+def test_iter_lines(text):
+    assert list(_iter_lines(text)) == text.split("\n")
+
+
+@pytest.mark.parametrize("line, token", [
+    ("MS:MS_RESULTS_FILE\tST000001_AN000001_Results.txt\tUNITS:peak area",
+     KeyValue("MS_RESULTS_FILE", "ST000001_AN000001_Results.txt UNITS:peak area")),
+    (" MS:MS_RESULTS_FILE\ta\tb", KeyValue("MS_RESULTS_FILE", "a b")),
+    ("NM:NMR_RESULTS_FILE\tST000001_AN000001_Results.txt", KeyValue("NMR_RESULTS_FILE", "ST000001_AN000001_Results.txt")),
+    ("MS:MS_COMMENTS\tsee MS_RESULTS_FILE", KeyValue("MS_COMMENTS", "see MS_RESULTS_FILE"))
+])
+def test_results_file_line(line, token):
+    assert next(tokenizer(line)) == token
+
+
+def test_item_line_mentioning_results_file():
+    # only results file items may have extra tab separated fields
+    with pytest.raises(ValueError):
+        list(tokenizer("MS:MS_COMMENTS\tsee MS_RESULTS_FILE\tfor details"))